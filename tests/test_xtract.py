@@ -1,12 +1,37 @@
 """Test suite for xtract.py X4 Foundations CAT file extractor."""
 
+import errno
 import logging
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 import pytest
 
-from xtract import collect_files, extract_cat, extraction_job, main, parse_arguments
+from xtract import (
+    PROCESS_CONTEXT,
+    USE_SENDFILE,
+    collect_files,
+    copy_range,
+    create_output_dirs,
+    extension_filter,
+    extract_cat,
+    extract_targets,
+    extraction_job,
+    main,
+    map_dat_file,
+    parse_arguments,
+    parse_cat_index,
+    plan_extraction,
+    read_cat_index,
+    read_cat_indexes,
+    write_entries,
+)
 
 
 def test_collect_files_no_cat_raises(tmp_path: Path) -> None:
@@ -124,19 +149,16 @@ def test_parse_arguments_with_flags() -> None:
         assert args.sourcedir == 'source'
         assert args.destdir == 'dest'
         assert args.expansions is True
-        # The include argument with type=list creates a list of individual characters
-        # This is a bug in the original code - should be type=str or no type
-        assert args.include == [['f', 'i', 'l', 'e', '1', '.', 'c', 'a', 't'], ['f', 'i', 'l', 'e', '2', '.', 'c', 'a', 't']]
+        assert args.include == ['file1.cat', 'file2.cat']
         assert args.types == "xml,lua"
         assert args.verbose is True
 
 
 def test_parse_arguments_include_files() -> None:
-    """Test argument parsing with include files - testing the actual behavior."""
+    """Test argument parsing with include files."""
     with patch('sys.argv', ['xtract.py', 'source', 'dest', '-i', 'file1.cat']):
         args = parse_arguments()
-        # Due to type=list in argparse, this creates a list of characters
-        assert args.include == [['f', 'i', 'l', 'e', '1', '.', 'c', 'a', 't']]
+        assert args.include == ['file1.cat']
 
 
 def test_collect_files_all_files(tmp_path: Path) -> None:
@@ -380,3 +402,513 @@ def test_collect_files_mixed_extensions(tmp_path: Path) -> None:
     result = collect_files(d, [])
     assert len(result) == 1
     assert result[0].name == "file.cat"
+
+
+def test_extract_cat_mmap_copy(tmp_path: Path) -> None:
+    """Test extraction from the memory mapped dat file used when sendfile is unavailable."""
+    cat = tmp_path / "test.cat"
+    dat = tmp_path / "test.dat"
+    cat.write_text("skip.bin foo bar 4 0 0\nkeep.xml foo bar 6 0 0\n")
+    dat.write_bytes(b"SKIP" + b"wanted")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    with patch('xtract.USE_SENDFILE', False), patch('xtract.COPY_CHUNK_SIZE', 4):
+        extract_cat(cat, out, ["xml"])
+
+    assert (out / "keep.xml").read_bytes() == b"wanted"
+    assert not (out / "skip.bin").exists()
+
+
+def test_extract_cat_truncated_dat_warns(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test that a dat file shorter than the index describes is reported."""
+    caplog.set_level(logging.WARNING)
+    cat = tmp_path / "test.cat"
+    dat = tmp_path / "test.dat"
+    cat.write_text("file.xml foo bar 10 0 0\n")
+    dat.write_bytes(b"short")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    extract_cat(cat, out, ["xml"])
+    assert any("Error while writing file" in r.message for r in caplog.records)
+
+
+def test_extract_cat_skipped_entries_not_read(tmp_path: Path) -> None:
+    """Test that filtered out entries only advance the dat offset and are never copied."""
+    cat = tmp_path / "test.cat"
+    dat = tmp_path / "test.dat"
+    cat.write_text("a.bin foo bar 3 0 0\nb.bin foo bar 2 0 0\nc.xml foo bar 4 0 0\n")
+    dat.write_bytes(b"aaa" + b"bb" + b"cccc")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    with patch('xtract.copy_range', wraps=copy_range) as spy:
+        extract_cat(cat, out, ["xml"])
+
+    spy.assert_called_once()
+    assert spy.call_args.args[2:] == (5, 4)
+    assert (out / "c.xml").read_bytes() == b"cccc"
+
+
+def test_extract_cat_extension_matching(tmp_path: Path) -> None:
+    """Test that extension filters ignore surrounding whitespace and case."""
+    cat = tmp_path / "test.cat"
+    dat = tmp_path / "test.dat"
+    cat.write_text("a.XML foo bar 1 0 0\nb.lua foo bar 1 0 0\nc.d/noext foo bar 1 0 0\n")
+    dat.write_bytes(b"abc")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    extract_cat(cat, out, ["xml", " lua"])
+
+    assert (out / "a.XML").read_bytes() == b"a"
+    assert (out / "b.lua").read_bytes() == b"b"
+    assert not (out / "c.d").exists()
+
+
+def test_extract_cat_wildcard(tmp_path: Path) -> None:
+    """Test that "*" extracts every entry regardless of extension."""
+    cat = tmp_path / "test.cat"
+    dat = tmp_path / "test.dat"
+    cat.write_text("a.bin foo bar 1 0 0\nb/noext foo bar 1 0 0\n")
+    dat.write_bytes(b"ab")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    extract_cat(cat, out, ["*"])
+
+    assert (out / "a.bin").read_bytes() == b"a"
+    assert (out / "b" / "noext").read_bytes() == b"b"
+
+
+def test_extraction_job_multiple_cats(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test that extraction_job extracts every cat file and reports failing ones."""
+    caplog.set_level(logging.ERROR)
+    cats = []
+    for n in range(4):
+        cat = tmp_path / f"0{n}.cat"
+        cat.write_text(f"dir/file{n}.xml foo bar 2 0 0\n")
+        (tmp_path / f"0{n}.dat").write_bytes(f"d{n}".encode())
+        cats.append(cat)
+    cats.append(tmp_path / "missing.cat")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    with patch('xtract.Progress'):
+        extraction_job("base", cats, out, ["xml"])
+
+    for n in range(4):
+        assert (out / "dir" / f"file{n}.xml").read_bytes() == f"d{n}".encode()
+    assert any("Error extracting" in r.message for r in caplog.records)
+
+
+def test_extract_cat_mmap_truncated_dat_warns(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test that a short dat file is reported when copying from the memory map."""
+    caplog.set_level(logging.WARNING)
+    cat = tmp_path / "test.cat"
+    dat = tmp_path / "test.dat"
+    cat.write_text("file.xml foo bar 10 0 0\n")
+    dat.write_bytes(b"short")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    with patch('xtract.USE_SENDFILE', False):
+        extract_cat(cat, out, ["xml"])
+    assert any("Error while writing file" in r.message for r in caplog.records)
+
+
+def test_parse_cat_index_offsets() -> None:
+    """Test that the index parser returns every entry with its dat offset."""
+    data = b"a.xml 3 1 h\r\nb.dds 10 1 h\n\nc/d.xml extra 2 1 h\n"
+
+    assert parse_cat_index(data) == [(b"a.xml", 0, 3), (b"b.dds", 3, 10), (b"c/d.xml", 13, 2)]
+
+
+def test_parse_cat_index_bad_size_raises() -> None:
+    """Test that a malformed size field is reported rather than silently shifting offsets."""
+    with pytest.raises(ValueError):
+        parse_cat_index(b"a.xml big 1 h\n")
+
+
+def test_extract_cat_output_mode(tmp_path: Path) -> None:
+    """Test that extracted files get their permissions when they are created."""
+    cat = tmp_path / "test.cat"
+    dat = tmp_path / "test.dat"
+    cat.write_text("file.xml foo bar 4 0 0\n")
+    dat.write_bytes(b"data")
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    umask = os.umask(0o022)
+    try:
+        extract_cat(cat, out, ["xml"])
+    finally:
+        os.umask(umask)
+
+    assert (out / "file.xml").stat().st_mode & 0o777 == 0o644
+
+
+def test_parse_cat_index_short_line_raises() -> None:
+    """Test that a line missing its trailing fields is reported."""
+    with pytest.raises(ValueError):
+        parse_cat_index(b"a.xml 3 1\n")
+
+
+@pytest.mark.parametrize(("extensions", "path", "expected"), [
+    (["xml"], b"dir/file.xml", True),
+    (["xml"], b"dir/file.XML", True),
+    (["xml"], b"dir/filexml", False),
+    (["xml"], b"dir/file.xmlx", False),
+    (["xml", "lua"], b"dir/file.lua", True),
+    (["xml", "lua"], b"dir.xml/file", False),
+    (["xml", "lua"], b"dir/file.dds", False),
+    (["*"], b"dir/anything", True),
+])
+def test_extension_filter(extensions: list[str], path: bytes, expected: bool) -> None:
+    """Test the specialised extension checks."""
+    assert extension_filter(extensions)(path) is expected
+
+
+def test_read_cat_index_uses_cache(tmp_path: Path) -> None:
+    """Test that an unchanged cat file is not parsed again."""
+    cat = tmp_path / "test.cat"
+    cat.write_text("file.xml foo bar 4 0 0\n")
+
+    first = read_cat_index(cat)
+    assert (tmp_path / ".xtract_cache" / "test.cat.pkl").exists()
+
+    with patch('xtract.parse_cat_index') as parse:
+        assert read_cat_index(cat) == first
+        parse.assert_not_called()
+
+
+def test_read_cat_index_refreshes_stale_cache(tmp_path: Path) -> None:
+    """Test that a modified cat file is parsed again."""
+    cat = tmp_path / "test.cat"
+    cat.write_text("file.xml foo bar 4 0 0\n")
+    read_cat_index(cat)
+
+    cat.write_text("file.xml foo bar 4 0 0\nother.lua foo bar 2 0 0\n")
+    assert read_cat_index(cat) == [(b"file.xml", 0, 4), (b"other.lua", 4, 2)]
+
+
+def test_read_cat_index_ignores_corrupt_cache(tmp_path: Path) -> None:
+    """Test that an unreadable cache file falls back to parsing."""
+    cat = tmp_path / "test.cat"
+    cat.write_text("file.xml foo bar 4 0 0\n")
+    cache = tmp_path / ".xtract_cache"
+    cache.mkdir()
+    (cache / "test.cat.pkl").write_bytes(b"not a pickle")
+
+    assert read_cat_index(cat) == [(b"file.xml", 0, 4)]
+
+
+def test_plan_extraction_later_cat_overrides(tmp_path: Path) -> None:
+    """Test that an entry in a later cat file replaces the same path from an earlier one."""
+    cat1 = tmp_path / "01.cat"
+    cat1.write_text("a.xml x y 3 0 0\nb.xml x y 2 0 0\n")
+    (tmp_path / "01.dat").write_bytes(b"oldbb")
+    cat2 = tmp_path / "02.cat"
+    cat2.write_text("c.dds x y 4 0 0\na.xml x y 3 0 0\n")
+    (tmp_path / "02.dat").write_bytes(b"ddddnew")
+
+    plan = plan_extraction([cat1, cat2], ["xml"])
+
+    assert plan == {cat1: [("b.xml", 3, 2)], cat2: [("a.xml", 4, 3)]}
+
+
+def test_plan_extraction_skips_cat_without_dat(tmp_path: Path) -> None:
+    """Test that a cat file without its dat file cannot override anything."""
+    cat1 = tmp_path / "01.cat"
+    cat1.write_text("a.xml x y 3 0 0\n")
+    (tmp_path / "01.dat").write_bytes(b"old")
+    cat2 = tmp_path / "02.cat"
+    cat2.write_text("a.xml x y 3 0 0\n")
+
+    assert plan_extraction([cat1, cat2], ["xml"]) == {cat1: [("a.xml", 0, 3)]}
+
+
+def test_extraction_job_writes_latest_version(tmp_path: Path) -> None:
+    """Test that overridden files end up with the contents of the last cat file."""
+    for n, payload in enumerate([b"v1", b"v2", b"v3"], start=1):
+        (tmp_path / f"0{n}.cat").write_text("dir/file.xml x y 2 0 0\n")
+        (tmp_path / f"0{n}.dat").write_bytes(payload)
+
+    out = tmp_path / "out"
+    out.mkdir()
+
+    with patch('xtract.Progress'), patch('xtract.write_entries', wraps=write_entries) as spy:
+        extraction_job("base", collect_files(tmp_path, []), out, ["xml"])
+
+    assert (out / "dir" / "file.xml").read_bytes() == b"v3"
+    spy.assert_called_once()
+
+
+def test_collect_files_load_order(tmp_path: Path) -> None:
+    """Test that cat files are returned in load order."""
+    for name in ["03.cat", "01.cat", "02.cat"]:
+        (tmp_path / name).write_text("")
+
+    assert [f.name for f in collect_files(tmp_path, [])] == ["01.cat", "02.cat", "03.cat"]
+
+
+def test_extract_targets_shared_progress(tmp_path: Path) -> None:
+    """Test that several targets are extracted together with one progress task each."""
+    targets = {}
+    for target in ["base", "ego_dlc_boron"]:
+        src = tmp_path / target
+        src.mkdir()
+        (src / "01.cat").write_text(f"{target}.xml x y 2 0 0\n")
+        (src / "01.dat").write_bytes(b"ok")
+        targets[target] = ([src / "01.cat"], tmp_path / "out" / target)
+
+    with patch('xtract.Progress') as mock_progress_class:
+        progress = mock_progress_class.return_value.__enter__.return_value
+        extract_targets(targets, ["xml"])
+
+    assert [c.args[0] for c in progress.add_task.call_args_list] == ["Base Game", "Kingdoms End"]
+    assert (tmp_path / "out" / "base" / "base.xml").read_bytes() == b"ok"
+    assert (tmp_path / "out" / "ego_dlc_boron" / "ego_dlc_boron.xml").read_bytes() == b"ok"
+
+
+def test_write_entries_shared_directory_cache(tmp_path: Path) -> None:
+    """Test that directories recorded by an earlier dat file are not created again."""
+    dat = tmp_path / "test.dat"
+    dat.write_bytes(b"abcd")
+    out = tmp_path / "out"
+    out.mkdir()
+
+    seen_dirs: set[str] = set()
+    write_entries(dat, out, [("dir/a.xml", 0, 2)], seen_dirs)
+    assert seen_dirs == {"dir"}
+
+    with patch('xtract.os.makedirs') as makedirs:
+        write_entries(dat, out, [("dir/b.xml", 2, 2)], seen_dirs)
+        makedirs.assert_not_called()
+    assert (out / "dir" / "b.xml").read_bytes() == b"cd"
+
+
+def test_extract_targets_batches_large_dat(tmp_path: Path) -> None:
+    """Test that a dat file split into several write batches is fully extracted."""
+    cat = tmp_path / "01.cat"
+    cat.write_text("".join(f"dir/file{n}.xml x y 1 0 0\n" for n in range(5)))
+    (tmp_path / "01.dat").write_bytes(b"abcde")
+    out = tmp_path / "out"
+
+    with patch('xtract.Progress') as mock_progress_class, patch('xtract.WRITE_BATCH_SIZE', 2):
+        progress = mock_progress_class.return_value.__enter__.return_value
+        extract_targets({"base": ([cat], out)}, ["xml"])
+
+    assert [(out / "dir" / f"file{n}.xml").read_bytes() for n in range(5)] == [b"a", b"b", b"c", b"d", b"e"]
+    assert sum(c.kwargs["advance"] for c in progress.update.call_args_list) == pytest.approx(1)
+
+
+def test_create_output_dirs(tmp_path: Path) -> None:
+    """Test that every distinct output directory is created once."""
+    out = tmp_path / "out"
+
+    with patch('xtract.os.makedirs', wraps=os.makedirs) as makedirs:
+        created = create_output_dirs(out, ["a/b/one.xml", "a/b/two.xml", "a/three.xml", "top.xml"])
+
+    assert created == {"", "a", "a/b"}
+    assert makedirs.call_count == 3
+    assert (out / "a" / "b").is_dir()
+
+
+def test_read_cat_indexes(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test reading several indexes, skipping cat files that are broken or have no dat file."""
+    caplog.set_level(logging.WARNING)
+    for name, index in [("01", "a.xml 1 0 0\n"), ("02", "b.xml 2 0 0\n"), ("03", "c.xml bad 0 0\n")]:
+        (tmp_path / f"{name}.cat").write_text(index)
+        (tmp_path / f"{name}.dat").write_bytes(b"xx")
+    (tmp_path / "04.cat").write_text("d.xml 1 0 0\n")
+    cats = [tmp_path / f"0{n}.cat" for n in range(1, 5)]
+
+    indexes = read_cat_indexes(cats)
+
+    assert indexes == {cats[0]: [(b"a.xml", 0, 1)], cats[1]: [(b"b.xml", 0, 2)]}
+    assert any("Error extracting" in r.message and "03.cat" in r.message for r in caplog.records)
+    assert any("Associated dat file" in r.message for r in caplog.records)
+    # Parsed indexes were cached, so they are not parsed again
+    with patch('xtract.read_cat_index') as read:
+        assert read_cat_indexes(cats[:2]) == indexes
+        read.assert_not_called()
+
+
+class BrokenPool:
+    """Stands in for a process pool whose workers died."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def __enter__(self) -> "BrokenPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        future.set_exception(BrokenProcessPool("A worker process was terminated"))
+        return future
+
+
+@pytest.mark.parametrize("pool", [Mock(side_effect=OSError("sem_open failed")), BrokenPool])
+def test_extract_targets_without_worker_processes(tmp_path: Path, pool) -> None:
+    """Test that indexes are parsed in the main process when the worker processes are unavailable."""
+    for name in ("01", "02", "03"):
+        (tmp_path / f"{name}.cat").write_text(f"file{name}.xml x y 2 0 0\n")
+        (tmp_path / f"{name}.dat").write_bytes(name.encode())
+    out = tmp_path / "out"
+
+    with patch('xtract.Progress'), patch('xtract.ProcessPoolExecutor', pool), \
+            patch('xtract.os.cpu_count', return_value=3):
+        extract_targets({"base": (sorted(tmp_path.glob("*.cat")), out)}, ["xml"])
+
+    for name in ("01", "02", "03"):
+        assert (out / f"file{name}.xml").read_bytes() == name.encode()
+
+
+def test_read_cat_indexes_worker_logging(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test that index parsing workers are not forked and hand their log records to the main process."""
+    caplog.set_level(logging.INFO, logger="xtract")
+    for name in ("01", "02"):
+        (tmp_path / f"{name}.cat").write_text("".join(f"{i}.xml 1 0 0\n" for i in range(10000)))
+        (tmp_path / f"{name}.dat").write_bytes(b"x" * 10000)
+    with patch('xtract.os.cpu_count', return_value=2):
+        indexes = read_cat_indexes([tmp_path / "01.cat", tmp_path / "02.cat"])
+
+    assert PROCESS_CONTEXT.get_start_method() != "fork"
+    assert len(indexes) == 2
+    worker_records = [r for r in caplog.records if r.processName != "MainProcess"]
+    assert [r.getMessage() for r in worker_records] == ["Processed 10000 lines..."] * 2
+
+
+@pytest.mark.skipif(not USE_SENDFILE, reason="sendfile is not used on this platform")
+def test_write_entries_sendfile_unsupported(tmp_path: Path) -> None:
+    """Test that entries are written from a memory map when the file system doesn't support sendfile."""
+    dat = tmp_path / "test.dat"
+    dat.write_bytes(b"abcdefgh")
+    out = tmp_path / "out"
+
+    with patch('xtract.os.sendfile', side_effect=OSError(errno.EINVAL, "Invalid argument")) as sendfile:
+        write_entries(dat, out, [("a.xml", 0, 3), ("b.xml", 3, 5)])
+
+    assert (out / "a.xml").read_bytes() == b"abc"
+    assert (out / "b.xml").read_bytes() == b"defgh"
+    sendfile.assert_called_once()
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available")
+def test_write_entries_drops_dat_pages(tmp_path: Path) -> None:
+    """Test that the range of the dat file that was written out is dropped from the page cache."""
+    dat = tmp_path / "test.dat"
+    dat.write_bytes(b"abcdefgh")
+    out = tmp_path / "out"
+    out.mkdir()
+
+    with patch('xtract.os.posix_fadvise', wraps=os.posix_fadvise) as fadvise:
+        write_entries(dat, out, [("a.xml", 2, 2), ("b.xml", 5, 3)])
+
+    assert fadvise.call_args.args[1:] == (2, 6, os.POSIX_FADV_DONTNEED)
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available")
+def test_write_entries_drops_dat_pages_after_unmapping(tmp_path: Path) -> None:
+    """Test that dat pages are only dropped from the page cache once the dat file is no longer mapped."""
+    dat = tmp_path / "test.dat"
+    dat.write_bytes(b"abcdefgh")
+    out = tmp_path / "out"
+    events = []
+
+    @contextmanager
+    def recording_map(d_file):
+        with map_dat_file(d_file) as view:
+            yield view
+        events.append("unmapped")
+
+    def recording_fadvise(fd, offset, length, advice):
+        if advice == os.POSIX_FADV_DONTNEED:
+            events.append("dropped")
+
+    with patch('xtract.USE_SENDFILE', False), patch('xtract.map_dat_file', recording_map), \
+            patch('xtract.os.posix_fadvise', side_effect=recording_fadvise):
+        write_entries(dat, out, [("a.xml", 2, 2)])
+
+    assert (out / "a.xml").read_bytes() == b"cd"
+    assert events == ["unmapped", "dropped"]
+
+
+def test_extract_targets_interrupt_cancels_pending(tmp_path: Path) -> None:
+    """Test that queued write batches are cancelled when extraction is interrupted."""
+    cat = tmp_path / "01.cat"
+    cat.write_text("".join(f"file{n}.xml x y 1 0 0\n" for n in range(5)))
+    (tmp_path / "01.dat").write_bytes(b"abcde")
+    out = tmp_path / "out"
+
+    # The first batch completes, the second one is kept running until the pool has been shut down
+    second_started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def blocking_write_entries(*args):
+        calls.append(args)
+        if len(calls) > 1:
+            second_started.set()
+            release.wait(timeout=10)
+        return write_entries(*args)
+
+    futures = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, /, *args, **kwargs):
+            future = super().submit(fn, *args, **kwargs)
+            futures.append(future)
+            return future
+
+        def shutdown(self, wait=True, *, cancel_futures=False):
+            super().shutdown(wait=False, cancel_futures=cancel_futures)
+            release.set()
+            super().shutdown(wait=wait)
+
+    def interrupt(*args, **kwargs):
+        second_started.wait(timeout=10)
+        raise KeyboardInterrupt
+
+    with patch('xtract.Progress') as mock_progress_class, patch('xtract.write_entries', blocking_write_entries), \
+            patch('xtract.ThreadPoolExecutor', RecordingExecutor), \
+            patch('xtract.WRITE_BATCH_SIZE', 1), patch('xtract.MAX_IO_WORKERS', 1):
+        progress = mock_progress_class.return_value.__enter__.return_value
+        progress.update.side_effect = interrupt
+        with pytest.raises(KeyboardInterrupt):
+            extract_targets({"base": ([cat], out)}, ["xml"])
+
+    assert len(futures) == 5
+    assert not futures[0].cancelled() and not futures[1].cancelled()
+    assert all(future.cancelled() for future in futures[2:])
+    assert len(calls) == 2
+
+
+def test_extract_targets_undecodable_path(tmp_path: Path) -> None:
+    """Test that a cat file with a path that is not valid UTF-8 doesn't stop other cat files."""
+    (tmp_path / "01.cat").write_text("good.xml x y 4 0 0\n")
+    (tmp_path / "01.dat").write_bytes(b"good")
+    (tmp_path / "02.cat").write_bytes(b"bad\xff.xml x y 3 0 0\n")
+    (tmp_path / "02.dat").write_bytes(b"bad")
+    out = tmp_path / "out"
+
+    with patch('xtract.Progress'):
+        extract_targets({"base": ([tmp_path / "01.cat", tmp_path / "02.cat"], out)}, ["xml"])
+
+    assert (out / "good.xml").read_bytes() == b"good"
+    if sys.platform.startswith("linux"):
+        assert (out / os.fsdecode(b"bad\xff.xml")).read_bytes() == b"bad"
@@ -1,21 +1,30 @@
 """Extracts files from Egosoft's X4 Foundations cat files."""
 
 import argparse
+import atexit
+import errno
 import logging
+import logging.handlers
+import mmap
+import multiprocessing
+import multiprocessing.queues
+import os
+import pickle
+import queue
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import tempfile
+from collections.abc import Callable, Collection, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
+from typing import BinaryIO
 
 from rich.console import Console
-from rich.progress import BarColumn, Progress, SpinnerColumn, TextColumn
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    filemode="w",
-    filename=f"xtract_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-)
+from rich.progress import BarColumn, Progress, SpinnerColumn, TaskID, TextColumn
+
 logger = logging.getLogger(__name__)
 console = Console()
 
@@ -31,6 +40,25 @@ EXPANSIONS = {
     "ego_dlc_mini_03": "...",
 }
 
+# Linux can copy between regular files in-kernel with sendfile, elsewhere entries are written from a memory map
+USE_SENDFILE = sys.platform.startswith("linux") and hasattr(os, "sendfile")
+# Errors sendfile fails with when a file system doesn't support it, entries are then written from a memory map
+SENDFILE_UNSUPPORTED = frozenset({errno.EINVAL, errno.ENOSYS})
+# Upper bound for a single write of a mapped entry
+COPY_CHUNK_SIZE = 1 << 20
+# Parsed cat indexes are cached per source directory, bump the version whenever their layout changes
+CACHE_DIR_NAME = ".xtract_cache"
+CACHE_VERSION = 1
+# Writing out dat files is I/O bound, so the pool is sized for disk queue depth rather than core count
+MAX_IO_WORKERS = 64
+# Number of entries of a dat file written by one worker at a time
+WRITE_BATCH_SIZE = 512
+# O_BINARY only exists (and matters) on Windows
+OUTPUT_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+# Index parsing workers are never forked from this (multi-threaded) process, they start from a clean interpreter
+PROCESS_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
 
 def parse_arguments() -> argparse.Namespace:
     """Parse command line arguments."""
@@ -48,7 +76,6 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument(
         "-i",
         "--include",
-        type=list,
         nargs="*",
         default=[],
         help="Specific files to extract. By default this is all cat files found in the directory.")
@@ -66,57 +93,495 @@ def parse_arguments() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def extract_cat(cat_file: Path, output: Path, extensions: list[str]) -> None:
+@contextmanager
+def map_dat_file(d_file: BinaryIO) -> Iterator[memoryview]:
     """
-    Extracts files from a cat file.
+    Memory maps a dat file, so entries can be written out as slices without copying them into Python objects first.
+
+    Args:
+        d_file (BinaryIO): The open dat file.
+
+    Yields:
+        memoryview: A read-only view of the mapped dat file.
+    """
+    # Empty files cannot be mapped
+    if os.fstat(d_file.fileno()).st_size == 0:
+        yield memoryview(b"")
+        return
+
+    with mmap.mmap(d_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mm) as view:
+            yield view
+
+
+@contextmanager
+def open_dat_source(d_file: BinaryIO) -> Iterator[int | memoryview]:
+    """
+    Provides the source that `copy_range` reads dat entries from.
+
+    With sendfile this is simply the dat file descriptor, otherwise the dat file is memory mapped.
+
+    Args:
+        d_file (BinaryIO): The open dat file.
+
+    Yields:
+        int | memoryview: The dat file descriptor, or a read-only view of the mapped dat file.
+    """
+    if USE_SENDFILE:
+        # Entries are copied in increasing offset order, so let the kernel read ahead aggressively
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(d_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        yield d_file.fileno()
+        return
+
+    with map_dat_file(d_file) as view:
+        yield view
+
+
+def copy_range(source: int | memoryview, out_fd: int, offset: int, size: int) -> None:
+    """
+    Copies a range of bytes from a dat file into an open output file.
+
+    Args:
+        source (int | memoryview): The dat file descriptor or mapped view, see `open_dat_source`.
+        out_fd (int): File descriptor of the output file.
+        offset (int): Position of the first byte to copy within the dat file.
+        size (int): Number of bytes to copy.
+
+    Raises:
+        OSError: If the dat file ends before `size` bytes could be copied.
+    """
+    if isinstance(source, int):
+        while size > 0:
+            sent = os.sendfile(out_fd, source, offset, size)
+            if sent == 0:
+                raise OSError(f"Unexpected end of dat file at offset {offset}")
+            offset += sent
+            size -= sent
+        return
+
+    with source[offset:offset + size] as data:
+        if len(data) < size:
+            raise OSError(f"Unexpected end of dat file at offset {offset + len(data)}")
+        written = 0
+        while written < size:
+            written += os.write(out_fd, data[written:written + COPY_CHUNK_SIZE])
+
+
+def extension_filter(extensions: Collection[str]) -> Callable[[bytes], bool]:
+    """
+    Builds a check telling whether a cat entry path has one of the requested extensions.
+
+    The check is specialised once for the requested extensions, since it runs for every entry of every cat file.
+
+    Args:
+        extensions (Collection[str]): File extensions to keep, "*" keeps every entry.
+
+    Returns:
+        Callable[[bytes], bool]: Returns True for entry paths that should be extracted.
+    """
+    ext_set = frozenset(e.strip().lower().encode() for e in extensions)
+
+    if b"*" in ext_set:
+        return lambda path: True
+
+    # A single extension is a plain suffix comparison, no need to locate the extension first
+    if len(ext_set) == 1:
+        suffix = b"." + next(iter(ext_set))
+        length = len(suffix)
+        return lambda path: path[-length:].lower() == suffix
+
+    def matches(path: bytes) -> bool:
+        dot = path.rfind(b".")
+        return dot > path.rfind(b"/") and path[dot + 1:].lower() in ext_set
+
+    return matches
+
+
+def parse_cat_index(data: bytes) -> list[tuple[bytes, int, int]]:
+    """
+    Parses the contents of a cat file.
+
+    Args:
+        data (bytes): The raw contents of the cat file.
+
+    Returns:
+        list[tuple[bytes, int, int]]: Path, dat offset and size of every entry, in dat order.
+
+    Raises:
+        ValueError: If a line does not contain the expected fields.
+    """
+    entries: list[tuple[bytes, int, int]] = []
+    # Entries are stored back to back in the dat file, in the same order as the index
+    pos = 0
+    # Checked once up front so the per-line cost is nil when INFO is filtered out
+    log_progress = logger.isEnabledFor(logging.INFO)
+    for i, line in enumerate(data.split(b"\n"), start=1):
+        if log_progress and i % 10000 == 0:
+            logger.info("Processed %d lines...", i)
+
+        # Line layout: <path> ... <size> <timestamp> <hash>, a bounded split only yields the fields we need
+        fields = line.rsplit(None, 3)
+        if not fields:
+            continue
+        rest, size_field, _, _ = fields
+
+        size = int(size_field)
+        entries.append((rest.partition(b" ")[0], pos, size))
+        pos += size
+
+    return entries
+
+
+def index_cache_location(cat_file: Path) -> tuple[Path, tuple[int, int, int]]:
+    """
+    Returns where the parsed index of a cat file is cached, and the key the cache has to match to be used.
 
     Args:
         cat_file (Path): The path to the cat file.
-        output (Path): The base directory where extracted files will be saved.
-        extensions (list): List of file extensions to filter files for extraction.
+
+    Returns:
+        tuple[Path, tuple[int, int, int]]: The cache file and the key for the current state of the cat file.
+    """
+    stat = cat_file.stat()
+    return cat_file.parent / CACHE_DIR_NAME / f"{cat_file.name}.pkl", (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+
+
+def load_cached_index(cat_file: Path) -> list[tuple[bytes, int, int]] | None:
+    """
+    Returns the cached index of a cat file if it is still up to date.
+
+    Args:
+        cat_file (Path): The path to the cat file.
+
+    Returns:
+        list[tuple[bytes, int, int]] | None: Path, dat offset and size of every entry,
+            or None if there is no usable cache.
+    """
+    cache_file, key = index_cache_location(cat_file)
+    try:
+        with Path.open(cache_file, "rb") as f:
+            cached_key, entries = pickle.load(f)
+        if cached_key == key:
+            logger.debug("Using cached index for %s", cat_file)
+            return entries
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.debug("Ignoring unreadable index cache %s: %s", cache_file, e)
+    return None
+
+
+def read_cat_index(cat_file: Path) -> list[tuple[bytes, int, int]]:
+    """
+    Returns the parsed index of a cat file, reusing the result of a previous run when the cat file is unchanged.
+
+    Parsed indexes are cached next to the cat files in a `.xtract_cache` directory. Failing to read or write
+    the cache is not an error, the index is simply parsed again.
+
+    Args:
+        cat_file (Path): The path to the cat file.
+
+    Returns:
+        list[tuple[bytes, int, int]]: Path, dat offset and size of every entry, in dat order.
+
+    Raises:
+        ValueError: If the cat file contains a malformed line.
+    """
+    entries = load_cached_index(cat_file)
+    if entries is not None:
+        return entries
+
+    cache_file, key = index_cache_location(cat_file)
+    entries = parse_cat_index(cat_file.read_bytes())
+
+    # Write to a temporary file first so concurrent or interrupted runs never see a partial cache
+    try:
+        cache_file.parent.mkdir(exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((key, entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, cache_file)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+    except OSError as e:
+        logger.debug("Could not write index cache %s: %s", cache_file, e)
+
+    return entries
+
+
+def find_dat_file(cat_file: Path) -> Path | None:
+    """
+    Locates the dat file holding the contents of a cat file.
+
+    Args:
+        cat_file (Path): The path to the cat file.
+
+    Returns:
+        Path | None: The dat file, or None if it is missing and the cat file should be skipped.
 
     Raises:
         FileNotFoundError: If the cat file does not exist.
-        OSError: If there is an error writing the extracted file.
-        Exception: For any other unexpected errors during extraction.
     """
-    logger.info(f"Processing {cat_file}...")
     if not cat_file.exists():
         raise FileNotFoundError(f"Cat file {cat_file} does not exist")
 
     dat_file = cat_file.with_suffix('.dat')
     if not dat_file.exists():
-        logger.warning(f"Associated dat file {dat_file} does not exist, skipping extraction for {cat_file}")
+        logger.warning("Associated dat file %s does not exist, skipping extraction for %s", dat_file, cat_file)
+        return None
+    return dat_file
+
+
+def write_entries(
+    dat_file: Path,
+    output: Path,
+    entries: list[tuple[str, int, int]],
+    seen_dirs: set[str] | None = None) -> None:
+    """
+    Writes entries of a dat file out to individual files.
+
+    Args:
+        dat_file (Path): The path to the dat file.
+        output (Path): The base directory where extracted files will be saved.
+        entries (list[tuple[str, int, int]]): Path, dat offset and size of every entry to write.
+            Entries should be in dat order so the dat file is read strictly forward.
+        seen_dirs (set[str] | None): Directories below `output` that already exist, updated as directories
+            are created. Share it between dat files extracted to the same output directory.
+
+    Raises:
+        OSError: If the dat file cannot be read or an output directory cannot be created.
+    """
+    # Directories already created, to avoid repeated mkdir/stat calls
+    if seen_dirs is None:
+        seen_dirs = set()
+    # Output paths are composed as plain strings, pathlib is too costly per entry
+    out_str = os.fspath(output)
+
+    with Path.open(dat_file, 'rb') as d_file:
+        with ExitStack() as stack:
+            source = stack.enter_context(open_dat_source(d_file))
+            for filepath, offset, size in entries:
+                file_parent = os.path.dirname(filepath)
+
+                if file_parent not in seen_dirs:
+                    os.makedirs(os.path.join(out_str, file_parent), exist_ok=True)
+                    seen_dirs.add(file_parent)
+
+                try:
+                    out_fd = os.open(os.path.join(out_str, filepath), OUTPUT_FLAGS, 0o644)
+                    try:
+                        try:
+                            copy_range(source, out_fd, offset, size)
+                        except OSError as e:
+                            if not isinstance(source, int) or e.errno not in SENDFILE_UNSUPPORTED:
+                                raise
+                            # Copy this and all remaining entries from a memory map instead
+                            logger.info("sendfile is not supported for %s, falling back to a memory map", dat_file)
+                            source = stack.enter_context(map_dat_file(d_file))
+                            os.ftruncate(out_fd, 0)
+                            os.lseek(out_fd, 0, os.SEEK_SET)
+                            copy_range(source, out_fd, offset, size)
+                    finally:
+                        os.close(out_fd)
+                except OSError as e:
+                    logger.warning("Error while writing file %s/%s: %s", output, filepath, e)
+                except Exception as e:
+                    logger.error("Unexpected error while writing file %s/%s: %s", output, filepath, e)
+
+        # The dat contents won't be needed again, so don't let them push other data out of the page cache.
+        # Only done once the dat file is unmapped, as mapped pages are not dropped.
+        if entries and hasattr(os, "posix_fadvise"):
+            start = entries[0][1]
+            end = entries[-1][1] + entries[-1][2]
+            os.posix_fadvise(d_file.fileno(), start, end - start, os.POSIX_FADV_DONTNEED)
+
+
+def extract_cat(cat_file: Path, output: Path, extensions: Collection[str]) -> None:
+    """
+    Extracts files from a cat file.
+
+    Args:
+        cat_file (Path): The path to the cat file.
+        output (Path): The base directory where extracted files will be saved.
+        extensions (Collection[str]): File extensions to filter files for extraction.
+
+    Raises:
+        FileNotFoundError: If the cat file does not exist.
+        OSError: If there is an error writing the extracted file.
+        Exception: For any other unexpected errors during extraction.
+    """
+    logger.info("Processing %s...", cat_file)
+    dat_file = find_dat_file(cat_file)
+    if dat_file is None:
         return
 
-    with Path.open(cat_file) as c_file, Path.open(dat_file, 'rb') as d_file:
-        for i, line in enumerate(c_file, start=1):
-            if i % 10000 == 0:
-                logger.info(f"Processed {i} lines...")
+    # Paths are only decoded for the entries we keep
+    wanted = extension_filter(extensions)
+    entries = [
+        (path.decode(errors="surrogateescape"), offset, size)
+        for path, offset, size in read_cat_index(cat_file) if wanted(path)
+    ]
+    write_entries(dat_file, output, entries)
+
+    logger.debug("Files of types %s extracted from %s to %s", ", ".join(sorted(extensions)), cat_file, output)
+
+
+def init_worker_logging(log_queue: multiprocessing.queues.Queue, level: int) -> None:
+    """
+    Forwards the log records of an index parsing worker process to the main process.
+
+    Args:
+        log_queue (multiprocessing.queues.Queue): The queue the main process handles worker log records from.
+        level (int): Level of the module logger in the main process.
+    """
+    logger.setLevel(level)
+    logging.root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
+def parse_in_workers(
+    cat_files: list[Path],
+    workers: int) -> tuple[dict[Path, list[tuple[bytes, int, int]]], list[Path]]:
+    """
+    Parses the indexes of several cat files in worker processes.
+
+    Cat files whose index cannot be read are logged and left out. If the worker processes cannot be started,
+    or die before finishing, the cat files they did not parse are returned to be parsed in this process instead.
+
+    Args:
+        cat_files (list[Path]): The cat files to parse.
+        workers (int): Number of worker processes to start.
+
+    Returns:
+        tuple[dict[Path, list[tuple[bytes, int, int]]], list[Path]]: Path, dat offset and size of every entry
+            per parsed cat file, and the cat files that are still to be parsed.
+    """
+    try:
+        # Only created once workers are needed, as it requires working POSIX semaphores
+        log_queue = PROCESS_CONTEXT.Queue()
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=PROCESS_CONTEXT,
+            initializer=init_worker_logging,
+            initargs=(log_queue, logger.getEffectiveLevel()),
+        )
+    except OSError as e:
+        # e.g. no working POSIX semaphores on this host
+        logger.warning("Unable to start index parsing workers, parsing in this process instead: %s", e)
+        return {}, cat_files
+
+    # Worker log records go to the handlers of this process, as if they were logged here
+    log_listener = logging.handlers.QueueListener(log_queue, *logging.root.handlers, respect_handler_level=True)
+    log_listener.start()
+    indexes: dict[Path, list[tuple[bytes, int, int]]] = {}
+    unparsed: list[Path] = []
+    try:
+        with executor:
+            futures = {cat_file: executor.submit(read_cat_index, cat_file) for cat_file in cat_files}
+            for cat_file, future in futures.items():
+                try:
+                    indexes[cat_file] = future.result()
+                except BrokenProcessPool:
+                    unparsed.append(cat_file)
+                except Exception as e:
+                    logger.error("Error extracting %s: %s", cat_file, e)
+    finally:
+        log_listener.stop()
+        log_queue.close()
+
+    if unparsed:
+        logger.warning("Index parsing workers stopped unexpectedly, parsing %d cat files in this process instead",
+                       len(unparsed))
+    return indexes, unparsed
+
+
+def read_cat_indexes(cat_files: list[Path]) -> dict[Path, list[tuple[bytes, int, int]]]:
+    """
+    Reads the indexes of several cat files, parsing the ones without an up to date cache in parallel.
 
-            fields = line.strip().split(" ")
+    Parsing is pure Python and holds the GIL, so it is spread over processes rather than threads,
+    falling back to this process when worker processes are unavailable.
+    Cat files without a dat file, or whose index cannot be read, are logged and left out.
 
-            filepath = Path(fields[0])
-            size = int(fields[-3])
-            file_parent = filepath.parent
+    Args:
+        cat_files (list[Path]): The cat files to read.
 
-            if filepath.suffix[1:] not in extensions and extensions != ['*']:
-                d_file.read(size)
+    Returns:
+        dict[Path, list[tuple[bytes, int, int]]]: Path, dat offset and size of every entry, per cat file.
+    """
+    indexes: dict[Path, list[tuple[bytes, int, int]]] = {}
+    to_parse: list[Path] = []
+    for cat_file in cat_files:
+        logger.info("Processing %s...", cat_file)
+        try:
+            if find_dat_file(cat_file) is None:
                 continue
+            entries = load_cached_index(cat_file)
+        except Exception as e:
+            logger.error("Error extracting %s: %s", cat_file, e)
+            continue
+        if entries is None:
+            to_parse.append(cat_file)
+        else:
+            indexes[cat_file] = entries
 
-            if not Path(output / file_parent).is_dir():
-                Path(output / file_parent).mkdir(parents=True)
+    workers = min(os.cpu_count() or 1, len(to_parse))
+    if workers > 1:
+        parsed, to_parse = parse_in_workers(to_parse, workers)
+        indexes.update(parsed)
 
-            try:
-                outf = Path.open(output / filepath, "wb")
-                outf.write(d_file.read(size))
-                outf.close()
-            except OSError:
-                logger.warning(f"Error while writing file {output}/{filepath}: {OSError}")
-            except Exception as e:
-                logger.error(f"Unexpected error while writing file {output}/{filepath}: {e}")
+    for cat_file in to_parse:
+        try:
+            indexes[cat_file] = read_cat_index(cat_file)
+        except Exception as e:
+            logger.error("Error extracting %s: %s", cat_file, e)
+
+    return indexes
+
+
+def plan_extraction(
+    cat_files: list[Path],
+    extensions: Collection[str],
+    indexes: dict[Path, list[tuple[bytes, int, int]]] | None = None) -> dict[Path, list[tuple[str, int, int]]]:
+    """
+    Works out which entries to write from which cat file for a set of cat files sharing an output directory.
 
-    logger.debug(f"Files of types {', '.join(extensions)} extracted from {cat_file} to {output}")
+    Like the game, later cat files override entries with the same path in earlier ones,
+    so only the last version of every file is planned and each output file is written once.
+
+    Args:
+        cat_files (list[Path]): The cat files, in load order.
+        extensions (Collection[str]): File extensions to filter files for extraction.
+        indexes (dict[Path, list[tuple[bytes, int, int]]] | None): Indexes already read with `read_cat_indexes`,
+            they are read here if not given.
+
+    Returns:
+        dict[Path, list[tuple[str, int, int]]]: Path, dat offset and size of the entries to write per cat file.
+            Cat files with nothing to write are left out.
+    """
+    if indexes is None:
+        indexes = read_cat_indexes(cat_files)
+
+    wanted = extension_filter(extensions)
+    # Entry path -> (cat file, dat offset, size) of the version that wins
+    latest: dict[bytes, tuple[Path, int, int]] = {}
+    for cat_file in cat_files:
+        for path, offset, size in indexes.get(cat_file, ()):
+            if wanted(path):
+                latest[path] = (cat_file, offset, size)
+
+    plan: dict[Path, list[tuple[str, int, int]]] = {}
+    for path, (cat_file, offset, size) in latest.items():
+        # Paths that are not valid UTF-8 keep their original bytes, so they can't abort the whole plan
+        plan.setdefault(cat_file, []).append((path.decode(errors="surrogateescape"), offset, size))
+    # Overridden paths keep their first position in `latest`, restore dat order for each cat file
+    for entries in plan.values():
+        entries.sort(key=itemgetter(1))
+    return plan
 
 
 def collect_files(source_dir: Path, include: list[str]) -> list[Path]:
@@ -125,101 +590,181 @@ def collect_files(source_dir: Path, include: list[str]) -> list[Path]:
 
     Args:
         source_dir (Path): The directory containing the cat files.
-        output (Path): The directory where extracted files will be saved.
-        extensions (list): List of file extensions to filter files for extraction.
-        include (list[str]): List of specific files to include in extraction.
+        include (list[str]): Names of specific cat files to include in extraction, all cat files if empty.
+
+    Returns:
+        list[Path]: The cat files to extract, in load order.
 
     Raises:
         FileNotFoundError: If no cat files are found in the source directory.
     """
     # Find all .cat files that do NOT have '_sig' before the suffix
-    all_files = [f for f in source_dir.glob("*.cat") if not f.stem.endswith("_sig")]
+    with os.scandir(source_dir) as entries:
+        all_files = [
+            Path(e.path) for e in entries
+            if e.name.endswith(".cat") and not e.name.endswith("_sig.cat") and e.is_file()
+        ]
 
     if not all_files:
         raise FileNotFoundError(f"No cat files found in {source_dir}")
 
+    # Sorted into load order, later cat files override earlier ones
+    all_files.sort()
+
     if include:
-        extract_files = [f for f in all_files if f.name in include]
+        include_names = set(include)
+        extract_files = [f for f in all_files if f.name in include_names]
     else:
         extract_files = all_files
 
-    logger.info(f"{len(extract_files)} cat files found for extraction...")
+    logger.info("%d cat files found for extraction...", len(extract_files))
     return extract_files
 
 
-def extraction_job(target: str, files: list[Path], output_dir: Path, extensions: list[str]) -> None:
+def create_output_dirs(output: Path, paths: Iterable[str]) -> set[str]:
     """
-    Extract all files for a given target (base or expansion).
+    Creates the directories needed to extract a set of files, visiting each distinct directory once.
 
     Args:
-        target (str): The name of the extraction target.
-        files (list[Path]): List of cat files to extract.
-        output_dir (Path): Directory to extract files into.
-        extensions (list[str]): List of file extensions to extract.
+        output (Path): The base directory where extracted files will be saved.
+        paths (Iterable[str]): Paths of the files to extract, relative to `output`.
+
+    Returns:
+        set[str]: The directories, relative to `output`, that were created or already existed.
+    """
+    out_str = os.fspath(output)
+    created: set[str] = set()
+    # Sorted so parents are handled before their subdirectories
+    for directory in sorted({os.path.dirname(path) for path in paths}):
+        try:
+            os.makedirs(os.path.join(out_str, directory), exist_ok=True)
+        except OSError as e:
+            logger.warning("Error while creating directory %s/%s: %s", output, directory, e)
+            continue
+        created.add(directory)
+    return created
+
+
+def extract_targets(targets: dict[str, tuple[list[Path], Path]], extensions: Collection[str]) -> None:
+    """
+    Extract all files for a set of targets (base game and expansions).
+
+    Overrides are resolved per target first, then the dat files of every target are written out in batches
+    from a single thread pool sized for I/O concurrency rather than for the number of cores.
+
+    Args:
+        targets (dict[str, tuple[list[Path], Path]]): Cat files to extract and output directory, per target name.
+        extensions (Collection[str]): File extensions to extract.
     """
+    # All indexes are read up front, so the uncached ones can be parsed in parallel across cat files
+    indexes = read_cat_indexes([cat_file for files, _ in targets.values() for cat_file in files])
+
     with Progress(
         SpinnerColumn(),
-        TextColumn(f"[progress.description]{EXPANSIONS.get(target, "Base Game"):{" "}<20} "),
+        TextColumn("[progress.description]{task.description:<20} "),
         BarColumn(bar_width=None),
         TextColumn("[progress.percentage]{task.percentage:>3.1f}%  "),
         console=console,
     ) as progress:
-        task_id = progress.add_task(f"{EXPANSIONS.get(target, "Base Game")}", total=len(files))
-        for cat_file in files:
+        # (progress task, cat file, share of the cat file, write_entries arguments)
+        jobs: list[tuple[TaskID, Path, float, tuple[Path, Path, list[tuple[str, int, int]], set[str]]]] = []
+        for target, (files, output_dir) in targets.items():
+            logger.debug("Target %s has %d files to extract.", target, len(files))
+            task_id = progress.add_task(EXPANSIONS.get(target, "Base Game"), total=len(files))
+            plan = plan_extraction(files, extensions, indexes)
+            if skipped := len(files) - len(plan):
+                progress.update(task_id, advance=skipped)
+            seen_dirs = create_output_dirs(output_dir, (path for entries in plan.values() for path, _, _ in entries))
+            for cat_file, entries in plan.items():
+                # Large dat files are split into batches so several threads can write them out at once
+                dat_file = cat_file.with_suffix('.dat')
+                for start in range(0, len(entries), WRITE_BATCH_SIZE):
+                    batch = entries[start:start + WRITE_BATCH_SIZE]
+                    share = len(batch) / len(entries)
+                    jobs.append((task_id, cat_file, share, (dat_file, output_dir, batch, seen_dirs)))
+
+        # With overrides resolved every output file comes from exactly one dat file,
+        # so all batches of all targets can be written out concurrently
+        workers = max(1, min(MAX_IO_WORKERS, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(write_entries, *arguments): (task_id, cat_file, share)
+                for task_id, cat_file, share, arguments in jobs
+            }
+            # Failing batches are only logged so the rest still gets extracted, but when interrupted
+            # (e.g. Ctrl+C) the queued batches are cancelled instead of waiting for all of them to run
             try:
-                extract_cat(cat_file, output_dir, extensions)
-            except Exception as e:
-                logger.error(f"Error extracting {cat_file}: {e}")
-            progress.update(task_id, description=f"{cat_file.name}..", advance=1)
+                for future in as_completed(futures):
+                    task_id, cat_file, share = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error("Error extracting %s: %s", cat_file, e)
+                    progress.update(task_id, advance=share)
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+
+def extraction_job(target: str, files: list[Path], output_dir: Path, extensions: Collection[str]) -> None:
+    """
+    Extract all files for a given target (base or expansion).
+
+    Args:
+        target (str): The name of the extraction target.
+        files (list[Path]): List of cat files to extract.
+        output_dir (Path): Directory to extract files into.
+        extensions (Collection[str]): File extensions to extract.
+    """
+    extract_targets({target: (files, output_dir)}, extensions)
 
 
 def main(
     foundation_dir: Path,
     target_dir: Path,
     expansions: bool,
-    file_types: list[str],
+    file_types: Collection[str],
     files_specified: list[str],
     mods: bool = False) -> None:
     """
     Main function to orchestrate the extraction of files from cat files.
 
     Args:
-        source_dir (Path): The directory containing the cat files.
-        output (Path): The directory where extracted files will be saved.
-        extensions (list): List of file extensions to filter files for extraction.
-        include (list[str]): List of specific files to include in extraction.
+        foundation_dir (Path): The game directory containing the base cat files.
+        target_dir (Path): The directory where extracted files will be saved.
+        expansions (bool): Whether to also extract the cat files of any installed expansions.
+        file_types (Collection[str]): File extensions to filter files for extraction.
+        files_specified (list[str]): Names of specific cat files to include in extraction, all cat files if empty.
+        mods (bool): Whether to also extract mods, not implemented yet.
 
     Raises:
-        ValueError: If no file types are specified for extraction.
-        FileNotFoundError: If the source directory does not exist.
-        FileNotFoundError: If no cat files are found in the source directory.
+        FileNotFoundError: If no cat files are found in the game directory or an expansion directory.
     """
     extraction_targets: dict[str, list[Path]] = {}
 
-    logger.info(f"Extracting core files from {foundation_dir}...")
-    logger.debug(f"(Extracting types: {', '.join(file_types)})")
+    logger.info("Extracting core files from %s...", foundation_dir)
+    logger.debug("(Extracting types: %s)", ", ".join(sorted(file_types)))
     extraction_targets["base"] = collect_files(foundation_dir, files_specified)
 
     if expansions:
         logger.info("Checking for expansions...")
         # Find all expansion folders in foundation_dir/extensions that start with 'ego_dlc_'
         extensions_dir = foundation_dir / "extensions"
-        if extensions_dir.exists() and extensions_dir.is_dir():
-            official_expansions: list[Path] = [
-            d for d in extensions_dir.iterdir()
-            if d.is_dir() and d.name.startswith("ego_dlc_")
-            ]
-            logger.debug(f"Expansions detected: {[d.name for d in official_expansions]}")
-        else:
-            official_expansions = []
-            logger.warning(f"No expansions directory found at {extensions_dir}!")
+        # Listing the directory directly doubles as the existence check
+        try:
+            with os.scandir(extensions_dir) as entries:
+                official_expansions: list[Path] = [
+                    Path(e.path) for e in entries
+                    if e.name.startswith("ego_dlc_") and e.is_dir()
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            logger.warning("No expansions directory found at %s!", extensions_dir)
             return
+        logger.debug("Expansions detected: %s", [d.name for d in official_expansions])
 
         for expansion in official_expansions:
-            logger.info(f"Extracting files from the {EXPANSIONS[expansion.name]} expansion...")
-            expansion_target_dir = target_dir / expansion.name
-            if not expansion_target_dir.exists():
-                Path.mkdir(expansion_target_dir, parents=True)
+            logger.info("Extracting files from the %s expansion...", EXPANSIONS[expansion.name])
+            (target_dir / expansion.name).mkdir(parents=True, exist_ok=True)
             extraction_targets[expansion.name] = collect_files(expansion, files_specified)
 
     if mods:
@@ -227,30 +772,29 @@ def main(
         logger.warning("Mod extraction is not implemented yet.")
         pass
 
-    # Prepare extraction jobs for parallel execution
-    with ThreadPoolExecutor() as executor:
-        futures = []
-        for target, files in extraction_targets.items():
-            logger.debug(f"Target {target} has {len(files)} files to extract.")
-            output_dir = target_dir if target == "base" else target_dir / target
-            futures.append(
-                executor.submit(
-                    extraction_job,
-                    target,
-                    files,
-                    output_dir,
-                    file_types,
-                )
-            )
-        # Wait for all jobs to complete
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                logger.error(f"Extraction job failed: {e}")
+    try:
+        extract_targets(
+            {
+                target: (files, target_dir if target == "base" else target_dir / target)
+                for target, files in extraction_targets.items()
+            },
+            file_types,
+        )
+    except Exception as e:
+        logger.error("Extraction job failed: %s", e)
 
 
 if __name__ == "__main__":
+    # Configured here rather than on import, so index parsing worker processes don't start log files of their own.
+    # Records are handed to a background thread for writing, so extraction threads never block on the log file.
+    log_file = logging.FileHandler(f"xtract_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log", mode="w")
+    log_file.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, log_file)
+    logging.root.setLevel(logging.INFO)
+    logging.root.addHandler(logging.handlers.QueueHandler(log_queue))
+    log_listener.start()
+    atexit.register(log_listener.stop)
     args = parse_arguments()
 
     if args.verbose:
@@ -258,10 +802,10 @@ if __name__ == "__main__":
 
     foundation_dir = Path(args.sourcedir).resolve()
     if not foundation_dir.exists():
-        logger.error(f"Source directory {foundation_dir} does not exist!")
+        logger.error("Source directory %s does not exist!", foundation_dir)
         sys.exit(1)
 
-    file_types: list[str] = args.types.split(",")
+    file_types = frozenset(t.strip().lower() for t in args.types.split(",") if t.strip())
     if not file_types:
         logger.error("File type flag provided without any extensions!")
         sys.exit(1)
@@ -269,15 +813,15 @@ if __name__ == "__main__":
     target_dir = Path(args.destdir).resolve()
     if target_dir.exists():
         if not target_dir.is_dir():
-            logger.error(f"Target path {target_dir} exists but is not a directory!")
+            logger.error("Target path %s exists but is not a directory!", target_dir)
             sys.exit(1)
         else:
-            logger.debug(f"Target directory {target_dir} exists. Files will be overwritten!")
-            logger.warning(f"""Target directory {target_dir} exists.
-                Most files should overwrite, but if you want a clean extraction please delete or move this directory first!"""
-                )
+            logger.debug("Target directory %s exists. Files will be overwritten!", target_dir)
+            logger.warning("""Target directory %s exists.
+                Most files should overwrite, but if you want a clean extraction please delete or move this directory first!""",
+                target_dir)
     else:
-        logger.debug(f"Creating target directory {target_dir}...")
+        logger.debug("Creating target directory %s...", target_dir)
         Path.mkdir(target_dir, parents=True)
 
     files_specified: list[str] = []
@@ -285,7 +829,7 @@ if __name__ == "__main__":
         if file.endswith(".cat"):
             files_specified.append(file)
         else:
-            logger.warning(f"File {file} does not appear to be a *.cat file, ignoring it.")
+            logger.warning("File %s does not appear to be a *.cat file, ignoring it.", file)
     if not files_specified:
         logger.info("No specific files provided for extraction, extracting all cat files found.")
         files_specified = []